@@ -1,19 +1,41 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pydeck as pdk
-import time
+import io
+import base64
+import csv
 import math
+import re
+import wave
+import zlib
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta, timezone
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
 from skyfield.api import Loader, EarthSatellite, wgs84, load as skyload
+from skyfield.constants import AU_KM, DAY_S
+from skyfield.framelib import itrs
+from skyfield.positionlib import Geocentric
+from skyfield.sgp4lib import TEME, theta_GMST1982
+from sgp4.api import SatrecArray, jday, accelerated
 
-# Try sound
+# Try HTTP cache (conditional GETs for TLE text)
 try:
-    from playsound import playsound
-    SOUND_OK = True
+    import requests_cache
+    HTTP_CACHE_OK = True
 except:
-    SOUND_OK = False
+    HTTP_CACHE_OK = False
+
+# Try Numba (compiled TEME -> geodetic kernel)
+try:
+    from numba import njit
+    NUMBA_OK = True
+except:
+    NUMBA_OK = False
 
 # ============ SKYFIELD SETUP ============
 load = Loader("./.skyfield")
@@ -33,25 +55,49 @@ OFFLINE_TLE = [
      "2 25544  51.6434 207.4032 0006396  92.0988  19.3512 15.49439215224343")
 ]
 
-def fetch_tle_group(group):
+# Name line followed by the two 69-column element lines
+_TLE_RE = re.compile(r"^([^\r\n]+)\r?\n(1 [^\r\n]{67})[ \t]*\r?\n(2 [^\r\n]{67})[ \t]*\r?$", re.M)
+
+# One keep-alive pool shared by every fetch. With requests-cache the TLE text is
+# kept on disk and revalidated with ETag/If-Modified-Since once it goes stale.
+if HTTP_CACHE_OK:
+    SESSION = requests_cache.CachedSession(".tle_cache", expire_after=1800, cache_control=True)
+else:
+    SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+
+@st.cache_data(ttl=1800, show_spinner=False)
+def fetch_tle_group(group, _session=SESSION):
+    # Raises instead of falling back so a failed fetch is never cached
     for base in CELESTRAK_URLS:
         try:
-            text = requests.get(base.format(group), timeout=6).text.splitlines()
-            out = []
-            i = 0
-            while i < len(text) - 2:
-                if text[i+1].startswith("1 ") and text[i+2].startswith("2 "):
-                    out.append((text[i].strip(), text[i+1].strip(), text[i+2].strip()))
-                    i += 3
-                else:
-                    i += 1
+            text = _session.get(base.format(group), timeout=6).text
+            out = [(m.group(1).strip(), m.group(2), m.group(3)) for m in _TLE_RE.finditer(text)]
             if out:
                 return out
         except:
             continue
-    st.warning("TLE fetch failed — using offline ISS TLE.")
-    return OFFLINE_TLE
+    raise ConnectionError(f"TLE fetch failed for {group}")
 
+def load_tles(groups):
+    # Fetch all groups in parallel; each failed group falls back to the offline ISS TLE
+    def fetch(group):
+        try:
+            return fetch_tle_group(group, SESSION)
+        except ConnectionError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        results = list(ex.map(fetch, groups))
+    out = []
+    for tles in results:
+        if tles is None:
+            st.warning("TLE fetch failed — using offline ISS TLE.")
+            tles = OFFLINE_TLE
+        out += tles
+    return out
+
+@st.cache_resource(show_spinner=False)
 def build_sats(tles):
     out = {}
     for name, l1, l2 in tles:
@@ -62,19 +108,217 @@ def build_sats(tles):
     return out
 
 # ============ GEO HELPERS ============
-def subpoint(sat, t):
-    p = wgs84.subpoint(sat.at(t))
-    return float(p.latitude.degrees), float(p.longitude.degrees), float(p.elevation.m)
-
-def topo(sat, t, lat, lon, elev):
-    obs = wgs84.latlon(lat, lon, elevation_m=elev)
-    diff = sat.at(t) - obs.at(t)
-    alt, az, dist = diff.altaz()
-    return float(alt.degrees), float(az.degrees), float(dist.km)
-
-def eci(sat, t):
-    at = sat.at(t)
-    return at.position.km, at.velocity.km_per_s
+_FP_ANGLES = np.linspace(0, 2 * np.pi, 80)
+_FP_COS = np.cos(_FP_ANGLES)
+_FP_SIN = np.sin(_FP_ANGLES)
+_EARTH_R_KM = 6371.0
+
+@lru_cache(maxsize=512)
+def footprint(lat, lon, alt_km):
+    # Visibility circle as [[lon, lat], ...]; callers pass rounded inputs so
+    # consecutive frames hit the same entry
+    ang = math.degrees(math.acos(min(1.0, max(-1.0, _EARTH_R_KM / (_EARTH_R_KM + alt_km + 600)))))
+    cos_lat = max(1e-6, math.cos(math.radians(lat)))
+    return np.column_stack([lon + ang * _FP_SIN / cos_lat, lat + ang * _FP_COS]).tolist()
+
+# Auxiliary layers are skipped for subpoints further than this from the camera
+_CULL_DEG = 100.0
+
+def nadir_distance(lats, lons, lat0, lon0):
+    # Great-circle angle in degrees from (lat0, lon0) to each subpoint
+    la, lo = np.radians(lats), np.radians(lons)
+    la0, lo0 = math.radians(lat0), math.radians(lon0)
+    c = np.sin(la) * math.sin(la0) + np.cos(la) * math.cos(la0) * np.cos(lo - lo0)
+    return np.degrees(np.arccos(np.clip(c, -1.0, 1.0)))
+
+def track(sat, base_tt, secs):
+    # Ground track at base_tt + secs (seconds array) in one vectorized propagation
+    t_arr = ts.tt_jd(base_tt + np.asarray(secs, dtype=np.float64) / 86400.0)
+    p = wgs84.subpoint(sat.at(t_arr))
+    return np.column_stack([p.longitude.degrees, p.latitude.degrees])
+
+def orbit_track(sat, name, base_tt, minutes):
+    # The orbit grid is anchored to the start of the current minute and reused
+    # for every frame in that minute; points already in the past are dropped
+    bucket = int(base_tt * 1440)
+    cache = st.session_state.get("orbit_cache", {})
+    key = (name, bucket, minutes)
+    if key not in cache:
+        cache = {k: v for k, v in cache.items() if k[1] == bucket}
+        secs = np.arange(0, minutes * 60 + 60, 20, dtype=np.float64)
+        cache[key] = track(sat, bucket / 1440.0, secs)
+        st.session_state["orbit_cache"] = cache
+    first = int((base_tt - bucket / 1440.0) * 86400.0 // 20) + 1
+    return cache[key][first:first + minutes * 3 - 1]
+
+def observer_frames(observers):
+    # ITRF positions (nobs, 3) in km and local east/north/up unit vectors (nobs, 3, 3),
+    # rebuilt only when the observer list is saved
+    version = st.session_state.get("obs_version", 0)
+    if st.session_state.get("obs_frames_version") != version:
+        lat = np.array([o["lat"] for o in observers], dtype=np.float64)
+        lon = np.array([o["lon"] for o in observers], dtype=np.float64)
+        elev = np.array([o["elev"] for o in observers], dtype=np.float64)
+        xyz = wgs84.latlon(lat, lon, elevation_m=elev).itrs_xyz.km.T
+        sl, cl = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+        so, co = np.sin(np.radians(lon)), np.cos(np.radians(lon))
+        enu = np.stack([
+            np.column_stack([-so, co, np.zeros_like(lat)]),
+            np.column_stack([-sl * co, -sl * so, cl]),
+            np.column_stack([cl * co, cl * so, sl]),
+        ], axis=1)
+        st.session_state["obs_frames"] = (xyz, enu)
+        st.session_state["obs_frames_version"] = version
+    return st.session_state["obs_frames"]
+
+def topo(sat_xyz, obs_xyz, obs_enu):
+    # Alt/az/range of one ITRF satellite position from every observer at once
+    d = sat_xyz - obs_xyz
+    e, n, u = np.einsum("kij,kj->ik", obs_enu, d)
+    dist = np.linalg.norm(d, axis=1)
+    alt = np.degrees(np.arcsin(u / dist))
+    az = np.degrees(np.arctan2(e, n)) % 360
+    return alt, az, dist
+
+# WGS84 ellipsoid in km
+_WGS84_A = 6378.137
+_WGS84_F = 1 / 298.257223563
+_WGS84_B = _WGS84_A * (1 - _WGS84_F)
+_WGS84_E2 = _WGS84_F * (2 - _WGS84_F)
+_WGS84_EP2 = (_WGS84_A ** 2 - _WGS84_B ** 2) / _WGS84_B ** 2
+
+def teme_to_geodetic(teme_xyz, gmst):
+    # TEME (nsat, 3) km -> ITRF (nsat, 3) km plus geodetic lat/lon (deg) and
+    # altitude (m): one GMST rotation, then Zhu's closed-form solution
+    n = teme_xyz.shape[0]
+    xyz = np.empty((n, 3))
+    lat = np.empty(n)
+    lon = np.empty(n)
+    alt = np.empty(n)
+    c, s = math.cos(gmst), math.sin(gmst)
+    a, b, e2, ep2 = _WGS84_A, _WGS84_B, _WGS84_E2, _WGS84_EP2
+    for i in range(n):
+        x = c * teme_xyz[i, 0] + s * teme_xyz[i, 1]
+        y = -s * teme_xyz[i, 0] + c * teme_xyz[i, 1]
+        z = teme_xyz[i, 2]
+        xyz[i, 0], xyz[i, 1], xyz[i, 2] = x, y, z
+        p2 = x * x + y * y
+        p = math.sqrt(p2)
+        F = 54.0 * b * b * z * z
+        G = p2 + (1.0 - e2) * z * z - e2 * (a * a - b * b)
+        cc = e2 * e2 * F * p2 / (G * G * G)
+        sk = (1.0 + cc + math.sqrt(cc * cc + 2.0 * cc)) ** (1.0 / 3.0)
+        k = sk + 1.0 + 1.0 / sk
+        P = F / (3.0 * k * k * G * G)
+        Q = math.sqrt(1.0 + 2.0 * e2 * e2 * P)
+        r0 = (-P * e2 * p / (1.0 + Q)
+              + math.sqrt(max(0.0, 0.5 * a * a * (1.0 + 1.0 / Q)
+                                   - P * (1.0 - e2) * z * z / (Q * (1.0 + Q)) - 0.5 * P * p2)))
+        U = math.sqrt((p - e2 * r0) ** 2 + z * z)
+        V = math.sqrt((p - e2 * r0) ** 2 + (1.0 - e2) * z * z)
+        z0 = b * b * z / (a * V)
+        lat[i] = math.degrees(math.atan2(z + ep2 * z0, p))
+        lon[i] = math.degrees(math.atan2(y, x))
+        alt[i] = U * (1.0 - b * b / (a * V)) * 1000.0
+    return xyz, lat, lon, alt
+
+# Serial on purpose: Streamlit runs the script off the main thread, where
+# Numba's parallel threading layers can hang, and nsat is small anyway.
+if NUMBA_OK:
+    teme_to_geodetic = njit(cache=True)(teme_to_geodetic)
+
+def sat_array(sats, names):
+    # SatrecArray is rebuilt only when the selection (or the loaded TLEs) change
+    key = tuple(names)
+    if st.session_state.get("sat_array_key") != key:
+        st.session_state["sat_array"] = SatrecArray([sats[n].model for n in names])
+        st.session_state["sat_array_key"] = key
+    return st.session_state["sat_array"]
+
+def propagate(sats, names, now, t):
+    # One SGP4 call for all satellites -> GCRS positions of shape (3, nsat),
+    # plus the raw TEME positions (nsat, 3)
+    jd, fr = jday(now.year, now.month, now.day, now.hour, now.minute,
+                  now.second + now.microsecond / 1e6)
+    e, r, v = sat_array(sats, names).sgp4(np.array([jd]), np.array([fr]))
+    r_teme = r[:, 0]
+    R = TEME.rotation_at(t).T
+    r = R.dot(r_teme.T) / AU_KM
+    v = R.dot(v[:, 0].T) / AU_KM * DAY_S
+    return e[:, 0], Geocentric(r, v, t), r_teme
+
+def warm_up():
+    # Push the offline ISS TLE through the scalar and array propagation paths
+    # once so the first real frame doesn't pay for backend initialisation
+    iss = build_sats(tuple(OFFLINE_TLE))[OFFLINE_TLE[0][0]]
+    t = ts.now()
+    iss.at(t)
+    track(iss, t.tt, [0.0, 30.0])
+    if NUMBA_OK:
+        teme_to_geodetic(np.array([[7000.0, 0.0, 0.0]]), 0.0)
+
+# ============ SGP4 BACKEND ============
+if "sgp4_warm" not in st.session_state:
+    warm_up()
+    st.session_state["sgp4_warm"] = True
+
+# ============ TRAILS ============
+# Each trail is a fixed-size float32 ring buffer of [lon, lat] rows
+def trail_points(tr):
+    # Oldest-to-newest view of the ring buffer
+    if tr["n"] < len(tr["buf"]):
+        return tr["buf"][:tr["n"]]
+    return np.roll(tr["buf"], -tr["head"], axis=0)
+
+def trail_push(trails, name, lon, lat, size):
+    tr = trails.get(name)
+    if tr is None or len(tr["buf"]) != size:
+        # New satellite or trail length changed: keep the newest points
+        old = trail_points(tr)[-size:] if tr else np.empty((0, 2), np.float32)
+        tr = {"buf": np.empty((size, 2), np.float32), "head": len(old) % size, "n": len(old)}
+        tr["buf"][:len(old)] = old
+        trails[name] = tr
+    tr["buf"][tr["head"]] = (lon, lat)
+    tr["head"] = (tr["head"] + 1) % size
+    tr["n"] = min(tr["n"] + 1, size)
+    return tr
+
+# Per-satellite trail colours, stable across reruns
+TRAIL_COLORS = [
+    [255, 165, 0], [255, 215, 0], [255, 99, 71],
+    [144, 238, 144], [238, 130, 238], [135, 206, 250],
+]
+
+def color_for(name):
+    return TRAIL_COLORS[zlib.crc32(name.encode("utf-8")) % len(TRAIL_COLORS)]
+
+# ============ ALERT SOUND ============
+def beep_wav(freq=880.0, secs=0.25, rate=22050):
+    # Short sine beep as 16-bit mono WAV bytes, faded out to avoid a click
+    t = np.arange(int(secs * rate)) / rate
+    pcm = np.sin(2 * np.pi * freq * t) * np.linspace(1.0, 0.0, t.size) * 0.5 * 32767
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.astype("<i2").tobytes())
+    return buf.getvalue()
+
+# Played by the user's browser, not the server
+_BEEP_B64 = base64.b64encode(beep_wav()).decode("ascii")
+BEEP_HTML = f'<audio autoplay src="data:audio/wav;base64,{_BEEP_B64}"></audio>'
+
+# ============ ECI LOG ============
+ECI_LOG_MAX = 100_000
+
+def eci_csv(log):
+    # Write rows straight to CSV bytes without building a DataFrame
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=list(log[0].keys()))
+    writer.writeheader()
+    writer.writerows(log)
+    return buf.getvalue().encode("utf-8")
 # ===========================
 #        PRO UI EFFECTS
 # ===========================
@@ -136,31 +380,28 @@ iframe {
 </style>
 """
 
-st.markdown(PRO_UI, unsafe_allow_html=True)
-
 # ===========================
 #           TITLE
 # ===========================
-st.markdown(
-    """
-    <h1 class="fade-in" style='color:white; font-weight:800; font-size:44px; margin-top: -10px;'>
-        <span class="glow-moon">🌙</span> Moonlit Satellite Tracker
-    </h1>
-    """,
-    unsafe_allow_html=True
-)
+TITLE = """
+<h1 class="fade-in" style='color:white; font-weight:800; font-size:44px; margin-top: -10px;'>
+    <span class="glow-moon">🌙</span> Moonlit Satellite Tracker
+</h1>
+"""
 
 # ===========================
 #          FOOTER
 # ===========================
-st.markdown(
-    """
-    <div class="footer">
-        Created By <b>Mann Monpara</b> © 2025
-    </div>
-    """,
-    unsafe_allow_html=True
-)
+FOOTER = """
+<div class="footer">
+    Created By <b>Mann Monpara</b> © 2025
+</div>
+"""
+
+# Static chrome goes out as one element. It is only re-sent on full script
+# reruns (widget changes); the timed map fragment never touches it.
+st.markdown(PRO_UI + TITLE + FOOTER, unsafe_allow_html=True)
+
 # ============ STREAMLIT SETUP ============
 st.set_page_config(page_title="Ultimate 3D Tracker — Clean", layout="wide")
 
@@ -173,20 +414,20 @@ groups = st.sidebar.multiselect(
 )
 
 if st.sidebar.button("Load TLEs", key="load_tles"):
-    all_tles = []
-    for g in groups:
-        all_tles += fetch_tle_group(g)
-    st.session_state["sats"] = build_sats(all_tles)
+    st.session_state["sats"] = build_sats(tuple(load_tles(groups)))
+    st.session_state.pop("sat_array_key", None)
     st.sidebar.success(f"Loaded {len(st.session_state['sats'])} satellites!")
 
 if "sats" not in st.session_state:
-    st.session_state["sats"] = build_sats(fetch_tle_group("stations"))
+    st.session_state["sats"] = build_sats(tuple(load_tles(["stations"])))
 
 sats = st.session_state["sats"]
 sat_list = sorted(sats.keys())
 
 # ============ TRACKING OPTIONS ============
 st.sidebar.header("Tracking Options")
+if not accelerated:
+    st.sidebar.warning("sgp4 C++ extension not available — using the slower pure-Python propagator.")
 
 selected_sats = st.sidebar.multiselect(
     "Select satellites",
@@ -220,6 +461,7 @@ with st.sidebar.expander("Edit Observers"):
     edited = st.data_editor(df_obs, num_rows="dynamic", key="edit_obs")
     if st.button("Save Observers", key="save_obs"):
         st.session_state["observers"] = edited.to_dict(orient="records")
+        st.session_state["obs_version"] = st.session_state.get("obs_version", 0) + 1
         st.sidebar.success("Saved!")
 
 # Trails
@@ -228,147 +470,113 @@ if "trails" not in st.session_state:
 
 # ECI log
 if "eci_log" not in st.session_state:
-    st.session_state["eci_log"] = []
+    st.session_state["eci_log"] = deque(maxlen=ECI_LOG_MAX)
 
 # Clear logs
 if st.sidebar.button("Clear Trails & Logs", key="clear_logs"):
     st.session_state["trails"] = {}
-    st.session_state["eci_log"] = []
+    st.session_state["eci_log"] = deque(maxlen=ECI_LOG_MAX)
     st.sidebar.success("Cleared!")
 
 # CSV download
-df_log = pd.DataFrame(st.session_state["eci_log"])
 if st.sidebar.button("Prepare CSV", key="prepare_csv"):
-    if df_log.empty:
+    if not st.session_state["eci_log"]:
         st.sidebar.warning("No ECI data yet!")
     else:
         st.sidebar.download_button(
             "Download ECI CSV",
-            df_log.to_csv(index=False).encode("utf-8"),
+            eci_csv(st.session_state["eci_log"]),
             file_name="eci_log.csv",
             mime="text/csv",
             key="csv_download"
         )
 
-# ============ 3D MAP PLACEHOLDER ============
-map_placeholder = st.empty()
+# ============ STATIC LAYERS ============
+# Built once per script run with stable ids so deck.gl keeps their buffers
+# across ticks; only the per-satellite layers are rebuilt in the fragment.
+GLOBE_LAYER = pdk.Layer(
+    "GeoJsonLayer",
+    id="globe",
+    data={"type": "Sphere", "radius": 6371000},
+    get_fill_color=[20, 30, 60, 255],
+)
+
+stations_layer = pdk.Layer(
+    "ScatterplotLayer",
+    id="ground-stations",
+    data=pd.DataFrame(st.session_state["observers"]),
+    get_position='[lon, lat]',
+    get_color='[0,200,255]',
+    get_radius=60000,
+)
 
 # ============ MAIN LOOP ============
-
-while True:
+# Only this fragment reruns every refresh_sec; the sidebar and page chrome
+# are left alone until a widget changes.
+@st.fragment(run_every=refresh_sec)
+def render_frame():
     now = datetime.utcnow().replace(tzinfo=timezone.utc)
     t_now = ts.from_datetime(now)
-    layers = []
+    base_tt = t_now.tt
+    observers = st.session_state["observers"]
+    obs_xyz, obs_enu = observer_frames(observers)
+    layers = [GLOBE_LAYER]
     alerts_msg = []
 
-    # Earth Globe Layer
-    layers.append(
-        pdk.Layer(
-            "GeoJsonLayer",
-            data={"type": "Sphere", "radius": 6371000},
-            get_fill_color=[20, 30, 60, 255],
-        )
-    )
+    names = [n for n in selected_sats if n in sats]
+    if names:
+        errs, geo, r_teme = propagate(sats, names, now, t_now)
+        positions, velocities = geo.position.km.T, geo.velocity.km_per_s.T
+        if NUMBA_OK:
+            gmst, _ = theta_GMST1982(t_now.whole, t_now.ut1_fraction)
+            sat_xyz, lats, lons, alts = teme_to_geodetic(r_teme, gmst)
+        else:
+            sub = wgs84.subpoint(geo)
+            lats, lons, alts = sub.latitude.degrees, sub.longitude.degrees, sub.elevation.m
+            sat_xyz = geo.frame_xyz(itrs).km.T
+
+    # The camera centre is only known while it follows the first satellite;
+    # then velocity/orbit/footprint work is skipped for the far side.
+    follow = follow_cam and names and not errs[0]
+    if follow:
+        cam_lat, cam_lon = float(lats[0]), float(lons[0])
+        in_view = nadir_distance(lats, lons, cam_lat, cam_lon) <= _CULL_DEG
+    else:
+        in_view = np.ones(len(names), dtype=bool)
 
-    for name in selected_sats:
-        sat = sats.get(name)
-        if sat is None:
+    trail_paths, trail_names = [], []
+    vel_paths, orbit_paths, fp_polys = [], [], []
+    for i, name in enumerate(names):
+        if errs[i]:
             continue
+        sat = sats[name]
 
-        lat, lon, alt_m = subpoint(sat, t_now)
+        lat, lon, alt_m = float(lats[i]), float(lons[i]), float(alts[i])
         alt_km = alt_m / 1000
 
         # ---- Trail ----
-        trail = st.session_state["trails"].setdefault(name, [])
-        trail.append([lon, lat])
-        if len(trail) > trail_len:
-            trail = trail[-trail_len:]
-            st.session_state["trails"][name] = trail
-
-        # Satellite marker
-        layers.append(
-            pdk.Layer(
-                "ScatterplotLayer",
-                data=[{"lon": lon, "lat": lat, "name": name, "alt": alt_km}],
-                get_position='[lon, lat]',
-                get_color='[255,0,0]',
-                get_radius=50000,
-                pickable=True,
-            )
-        )
+        trail = trail_points(trail_push(st.session_state["trails"], name, lon, lat, trail_len))
 
-        # Trail line
         if len(trail) > 1:
-            layers.append(
-                pdk.Layer(
-                    "PathLayer",
-                    data=[{"path": trail}],
-                    get_path="path",
-                    get_color="[255,165,0]",
-                    width_scale=10,
-                    width_min_pixels=2,
-                )
-            )
+            trail_paths.append(trail.tolist())
+            trail_names.append(name)
 
-        # Velocity vector
-        if show_vel:
-            tf = ts.from_datetime(now + timedelta(seconds=30))
-            lat2, lon2, _ = subpoint(sat, tf)
-            layers.append(
-                pdk.Layer(
-                    "PathLayer",
-                    data=[{"path": [[lon, lat], [lon2, lat2]]}],
-                    get_path="path",
-                    get_color="[255,0,255]",
-                    width_scale=10,
-                    width_min_pixels=2,
-                )
-            )
+        # Velocity, orbit and footprint only for satellites facing the camera
+        if in_view[i]:
+            # Velocity vector
+            if show_vel:
+                vel_paths.append(track(sat, base_tt, [0.0, 30.0]).tolist())
 
-        # Orbit projection
-        if show_orbit:
-            orbit_pts = []
-            for sec in range(0, orbit_mins * 60, 20):
-                tf = ts.from_datetime(now + timedelta(seconds=sec))
-                la, lo, _ = subpoint(sat, tf)
-                orbit_pts.append([lo, la])
-            layers.append(
-                pdk.Layer(
-                    "PathLayer",
-                    data=[{"path": orbit_pts}],
-                    get_path="path",
-                    get_color="[0,180,255]",
-                    width_scale=6,
-                    width_min_pixels=2,
-                )
-            )
+            # Orbit projection
+            if show_orbit:
+                orbit_paths.append([[lon, lat]] + orbit_track(sat, name, base_tt, orbit_mins).tolist())
 
-        # Footprint
-        if show_fp:
-            R = 6371.0
-            try:
-                ang = math.degrees(math.acos(R / (R + alt_km + 600)))
-            except:
-                ang = 20
-            fp = []
-            for a in np.linspace(0, 360, 80):
-                rad = math.radians(a)
-                la = lat + ang * math.cos(rad)
-                lo = lon + (ang * math.sin(rad)) / max(1e-6, math.cos(math.radians(lat)))
-                fp.append([lo, la])
-            layers.append(
-                pdk.Layer(
-                    "PolygonLayer",
-                    data=[{"polygon": fp}],
-                    get_polygon="polygon",
-                    get_fill_color="[50,200,50,40]",
-                    get_line_color="[50,200,50]",
-                    line_width_min_pixels=1,
-                )
-            )
+            # Footprint
+            if show_fp:
+                fp_polys.append(footprint(round(lat, 1), round(lon, 1), round(alt_km)))
 
         # ECI Logging
-        pos, vel = eci(sat, t_now)
+        pos, vel = positions[i], velocities[i]
         st.session_state["eci_log"].append({
             "time": now.isoformat(),
             "sat": name,
@@ -380,30 +588,95 @@ while True:
         })
 
         # Alerts
-        for obs in st.session_state["observers"]:
-            al, az, dist = topo(sat, t_now, obs["lat"], obs["lon"], obs["elev"])
-            if dist <= alert_dist or al >= alert_elev:
-                alerts_msg.append(f"⚠ {name} near {obs['name']} — {dist:.1f} km, elev {al:.1f}°")
+        obs_alt, _, obs_dist = topo(sat_xyz[i], obs_xyz, obs_enu)
+        hits = np.flatnonzero((obs_dist <= alert_dist) | (obs_alt >= alert_elev))
+        for j in hits:
+            alerts_msg.append(
+                f"⚠ {name} near {observers[j]['name']} — {obs_dist[j]:.1f} km, elev {obs_alt[j]:.1f}°"
+            )
 
-    # Ground stations
-    layers.append(
-        pdk.Layer(
-            "ScatterplotLayer",
-            data=st.session_state["observers"],
-            get_position='[lon, lat]',
-            get_color='[0,200,255]',
-            get_radius=60000,
+    # Trails (one layer, coloured per satellite)
+    if trail_paths:
+        layers.append(
+            pdk.Layer(
+                "PathLayer",
+                id="trails",
+                data=pd.DataFrame({
+                    "path": trail_paths,
+                    "name": trail_names,
+                    "color": [color_for(n) for n in trail_names],
+                }),
+                get_path="path",
+                get_color="color",
+                width_scale=10,
+                width_min_pixels=2,
+            )
         )
-    )
+
+    # Velocity vectors, orbit tracks and footprints (one layer each)
+    if vel_paths:
+        layers.append(
+            pdk.Layer(
+                "PathLayer",
+                id="velocity",
+                data=pd.DataFrame({"path": vel_paths}),
+                get_path="path",
+                get_color="[255,0,255]",
+                width_scale=10,
+                width_min_pixels=2,
+            )
+        )
+    if orbit_paths:
+        layers.append(
+            pdk.Layer(
+                "PathLayer",
+                id="orbits",
+                data=pd.DataFrame({"path": orbit_paths}),
+                get_path="path",
+                get_color="[0,180,255]",
+                width_scale=6,
+                width_min_pixels=2,
+            )
+        )
+    if fp_polys:
+        layers.append(
+            pdk.Layer(
+                "PolygonLayer",
+                id="footprints",
+                data=pd.DataFrame({"polygon": fp_polys}),
+                get_polygon="polygon",
+                get_fill_color="[50,200,50,40]",
+                get_line_color="[50,200,50]",
+                line_width_min_pixels=1,
+            )
+        )
+
+    # Satellite markers (one layer for all satellites)
+    if names:
+        ok = errs == 0
+        layers.append(
+            pdk.Layer(
+                "ScatterplotLayer",
+                id="satellites",
+                data=pd.DataFrame({
+                    "lon": lons[ok],
+                    "lat": lats[ok],
+                    "name": np.array(names)[ok],
+                    "alt": alts[ok] / 1000,
+                }),
+                get_position='[lon, lat]',
+                get_color='[255,0,0]',
+                get_radius=50000,
+                pickable=True,
+            )
+        )
+
+    # Ground stations
+    layers.append(stations_layer)
 
     # CAMERA FOLLOW
-    if follow_cam and selected_sats:
-        try:
-            first_sat = sats[selected_sats[0]]
-            la, lo, _ = subpoint(first_sat, t_now)
-            view = pdk.ViewState(latitude=la, longitude=lo, zoom=2, pitch=40)
-        except:
-            view = pdk.ViewState(latitude=0, longitude=0, zoom=0.5)
+    if follow:
+        view = pdk.ViewState(latitude=cam_lat, longitude=cam_lon, zoom=2, pitch=40)
     else:
         view = pdk.ViewState(latitude=0, longitude=0, zoom=0.5)
 
@@ -415,15 +688,12 @@ while True:
         layers=layers,
     )
 
-    map_placeholder.pydeck_chart(deck)
+    st.pydeck_chart(deck)
 
     # Show Alerts
     for m in alerts_msg:
         st.warning(m)
-        if sound_alert and SOUND_OK:
-            try:
-                playsound("beep.mp3", block=False)
-            except:
-                pass
+    if alerts_msg and sound_alert:
+        components.html(BEEP_HTML, height=0)
 
-    time.sleep(refresh_sec)
+render_frame()